@@ -5,7 +5,7 @@ PRAiTEQx Model Configuration
 
 import os
 from dataclasses import dataclass
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 @dataclass
 class ModelConfig:
@@ -68,6 +68,13 @@ MODEL_CONFIGS = {
     )
 }
 
+# Struct-of-arrays view of MODEL_CONFIGS for paths that touch one field at a time
+MODEL_KEYS: Tuple[str, ...] = tuple(MODEL_CONFIGS)
+MODEL_NAMES: Tuple[str, ...] = tuple(c.name for c in MODEL_CONFIGS.values())
+MODEL_EXPERT_TYPES: Tuple[str, ...] = tuple(c.expert_type for c in MODEL_CONFIGS.values())
+MODEL_MAX_TOKENS: Tuple[int, ...] = tuple(c.max_tokens for c in MODEL_CONFIGS.values())
+MODEL_TEMPERATURES: Tuple[float, ...] = tuple(c.temperature for c in MODEL_CONFIGS.values())
+
 # Expert Selection Rules
 EXPERT_SELECTION_RULES = {
     "code": ["code_expert", "logic_expert"],
@@ -86,5 +93,13 @@ SYSTEM_CONFIG = {
     "response_timeout": 30,
     "enable_caching": True,
     "cache_size": 1000,
+    "cache_dir": os.getenv("PRAITEQX_CACHE_DIR", os.path.join("data", "response_cache")),
+    "disk_cache_size_limit": 2**30,
+    "cache_min_chars": int(os.getenv("PRAITEQX_CACHE_MIN_CHARS", "64")),
+    # Load real weights and run real inference instead of the MVP simulation;
+    # at most max_concurrent_models stay resident (least recently used unloaded)
+    "load_real_models": os.getenv("PRAITEQX_LOAD_MODELS", "0") == "1",
+    "local_model_cache_dir": os.getenv("PRAITEQX_MODEL_CACHE_DIR"),
+    "local_model_cache_max_usage": 0.8,
     "log_level": "INFO"
 }
\ No newline at end of file
@@ -4,7 +4,7 @@ Updated Main Application Entry Point
 """
 
 import argparse
-import sys
+import os
 from loguru import logger
 
 def main():
@@ -23,17 +23,22 @@ def main():
     logger.info("🧠 6 AI Experts: Chat, Code, Creative, Quick, Logic, Search")
     
     if args.mode == "api":
-        from src.api.app import create_app
         import uvicorn
-        app = create_app()
         logger.info(f"🌐 FastAPI Server starting at http://{args.host}:{args.api_port}")
-        uvicorn.run(app, host=args.host, port=args.api_port, reload=True)
+        # Import string + factory so uvicorn can spawn workers or reload;
+        # each worker holds its own AIService cache
+        uvicorn.run("src.api.app:create_app", factory=True,
+                    host=args.host, port=args.api_port,
+                    loop="auto", http="auto",
+                    workers=int(os.getenv("API_WORKERS", "1")),
+                    reload=os.getenv("RELOAD", "0") == "1")
         
     elif args.mode == "ui":
         from src.ui.gradio_interface import create_gradio_app
         logger.info(f"🎨 Gradio UI starting at http://{args.host}:{args.ui_port}")
         interface = create_gradio_app(f"http://{args.host}:{args.api_port}")
-        interface.launch(server_name=args.host, server_port=args.ui_port, share=True)
+        interface.launch(server_name=args.host, server_port=args.ui_port,
+                         share=os.getenv("GRADIO_SHARE", "0") == "1")
         
     else:  # full mode
         from src.ui.launch import main as launch_main
@@ -4,21 +4,34 @@ Main API backend for the Multi-Expert AI System
 """
 
 import asyncio
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any
 from loguru import logger
+import orjson
 import time
 
 from src.models.ai_service import AIService
 
+# Pre-serialized bodies for the static / and frequently polled /health endpoints
+_ROOT_BODY = orjson.dumps({
+    "message": "🧠 PRAiTEQx Multi-Expert AI System",
+    "version": "1.0.0-MVP",
+    "docs": "/docs",
+    "status": "operational"
+})
+_HEALTH_PREFIX = b'{"status":"healthy","timestamp":'
+_HEALTH_SUFFIX = b',"system":"PRAiTEQx Multi-Expert AI"}'
+
 # Pydantic models for request/response
 class QueryRequest(BaseModel):
     query: str
     use_multi_expert: Optional[bool] = True
     max_experts: Optional[int] = 2
+    session_id: Optional[str] = None
 
 class QueryResponse(BaseModel):
     success: bool
@@ -35,18 +48,19 @@ class SystemStatus(BaseModel):
     loaded_models: list
     available_experts: list
     cache_size: int
+    cache_stats: Dict[str, int]
+    cache_stats_by_length: Dict[str, Dict[str, int]]
     status: str
 
-# Initialize AI Service
-ai_service = None
-
-async def get_ai_service():
-    """Get or initialize AI service"""
-    global ai_service
-    if ai_service is None:
-        ai_service = AIService()
-        logger.info("🚀 AI Service initialized")
-    return ai_service
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Initialize services once before the server accepts requests"""
+    logger.info("🚀 Starting PRAiTEQx API Server...")
+    app.state.ai_service = AIService()
+    logger.info("🚀 AI Service initialized")
+    logger.info("✅ Server ready to handle requests!")
+    yield
+    app.state.ai_service.disk_cache.close()
 
 def create_app() -> FastAPI:
     """Create and configure FastAPI application"""
@@ -56,7 +70,9 @@ def create_app() -> FastAPI:
         description="Advanced AI system with 6 specialized experts working in harmony",
         version="1.0.0-MVP",
         docs_url="/docs",
-        redoc_url="/redoc"
+        redoc_url="/redoc",
+        lifespan=lifespan,
+        default_response_class=ORJSONResponse
     )
     
     # Add CORS middleware
@@ -68,36 +84,25 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
     
-    @app.on_event("startup")
-    async def startup_event():
-        """Initialize services on startup"""
-        logger.info("🚀 Starting PRAiTEQx API Server...")
-        await get_ai_service()
-        logger.info("✅ Server ready to handle requests!")
-    
     @app.get("/")
     async def root():
         """Root endpoint"""
-        return {
-            "message": "🧠 PRAiTEQx Multi-Expert AI System",
-            "version": "1.0.0-MVP",
-            "docs": "/docs",
-            "status": "operational"
-        }
+        return Response(_ROOT_BODY, media_type="application/json")
     
     @app.post("/query", response_model=QueryResponse)
-    async def process_query(request: QueryRequest):
+    async def process_query(request: QueryRequest, http_request: Request):
         """Process AI query through multi-expert system"""
         try:
             start_time = time.time()
-            service = await get_ai_service()
+            service: AIService = http_request.app.state.ai_service
             
             logger.info(f"📥 New query received: {request.query[:100]}...")
             
             # Process query through AI service
             result = await service.process_query(
                 query=request.query,
-                use_multi_expert=request.use_multi_expert
+                use_multi_expert=request.use_multi_expert,
+                session_id=request.session_id
             )
             
             processing_time = time.time() - start_time
@@ -116,11 +121,34 @@ def create_app() -> FastAPI:
             logger.error(f"❌ Error processing query: {e}")
             raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
+    @app.post("/query/stream")
+    async def process_query_stream(request: QueryRequest, http_request: Request):
+        """Stream an AI query response as Server-Sent Events"""
+        service: AIService = http_request.app.state.ai_service
+        logger.info(f"📥 New streaming query received: {request.query[:100]}...")
+        
+        async def event_stream():
+            start_time = time.time()
+            try:
+                async for event in service.process_query_stream(
+                    query=request.query,
+                    use_multi_expert=request.use_multi_expert,
+                    session_id=request.session_id
+                ):
+                    if event["type"] == "done":
+                        event["processing_time"] = time.time() - start_time
+                    yield b"data: " + orjson.dumps(event) + b"\n\n"
+            except Exception as e:
+                logger.error(f"❌ Error streaming query: {e}")
+                yield b"data: " + orjson.dumps({"type": "error", "message": str(e)}) + b"\n\n"
+        
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+    
     @app.get("/status", response_model=SystemStatus)
-    async def get_system_status():
+    async def get_system_status(http_request: Request):
         """Get current system status"""
         try:
-            service = await get_ai_service()
+            service: AIService = http_request.app.state.ai_service
             status = await service.get_system_status()
             
             return SystemStatus(**status)
@@ -130,10 +158,10 @@ def create_app() -> FastAPI:
             raise HTTPException(status_code=500, detail=f"Error getting status: {str(e)}")
     
     @app.post("/clear-cache")
-    async def clear_cache():
+    async def clear_cache(http_request: Request):
         """Clear response cache"""
         try:
-            service = await get_ai_service()
+            service: AIService = http_request.app.state.ai_service
             await service.clear_cache()
             return {"message": "✅ Cache cleared successfully"}
             
@@ -141,32 +169,38 @@ def create_app() -> FastAPI:
             logger.error(f"❌ Error clearing cache: {e}")
             raise HTTPException(status_code=500, detail=f"Error clearing cache: {str(e)}")
     
+    # Expert metadata is static, so serialize the /experts body once
+    from config.model_config import (
+        MODEL_KEYS, MODEL_NAMES, MODEL_EXPERT_TYPES, MODEL_MAX_TOKENS, MODEL_TEMPERATURES
+    )
+    
+    experts_body = orjson.dumps({
+        "total_experts": len(MODEL_KEYS),
+        "experts": {
+            key: {
+                "name": name,
+                "expert_type": expert_type,
+                "max_tokens": max_tokens,
+                "temperature": temperature
+            }
+            for key, name, expert_type, max_tokens, temperature in zip(
+                MODEL_KEYS, MODEL_NAMES, MODEL_EXPERT_TYPES,
+                MODEL_MAX_TOKENS, MODEL_TEMPERATURES
+            )
+        }
+    })
+    
     @app.get("/experts")
     async def get_available_experts():
         """Get list of available AI experts"""
-        from config.model_config import MODEL_CONFIGS
-        
-        experts = {}
-        for key, config in MODEL_CONFIGS.items():
-            experts[key] = {
-                "name": config.name,
-                "expert_type": config.expert_type,
-                "max_tokens": config.max_tokens,
-                "temperature": config.temperature
-            }
-        
-        return {
-            "total_experts": len(experts),
-            "experts": experts
-        }
+        return Response(experts_body, media_type="application/json")
     
     @app.get("/health")
     async def health_check():
         """Health check endpoint"""
-        return {
-            "status": "healthy",
-            "timestamp": time.time(),
-            "system": "PRAiTEQx Multi-Expert AI"
-        }
+        return Response(
+            _HEALTH_PREFIX + orjson.dumps(time.time()) + _HEALTH_SUFFIX,
+            media_type="application/json"
+        )
     
     return app
\ No newline at end of file
@@ -4,10 +4,61 @@ High-level AI service that orchestrates expert selection and response generation
 """
 
 import asyncio
-from typing import Dict, List, Optional
+import time
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+import diskcache
+import xxhash
 from loguru import logger
 from .expert_selector import ExpertSelector
 from .model_manager import ModelManager
+from .response_cache import ResponseCache
+from config.model_config import SYSTEM_CONFIG
+
+# Bump when the cached result layout changes so stale disk entries are ignored
+CACHE_KEY_VERSION = "1"
+
+# Query length buckets (in characters) for cache hit-rate tracking
+_LENGTH_BUCKETS = (64, 256, 1024, 4096)
+
+def _length_bucket(length: int) -> str:
+    """Label the length bucket a query falls into"""
+    for bound in _LENGTH_BUCKETS:
+        if length < bound:
+            return f"<{bound}"
+    return f">={_LENGTH_BUCKETS[-1]}"
+
+class _StreamFanout:
+    """Events of one in-flight streamed response, replayed to every subscriber"""
+    
+    def __init__(self):
+        self.events: List[Dict] = []
+        self.finished = False
+        self.subscribers = 0
+        self._changed = asyncio.Event()
+    
+    def publish(self, event: Dict):
+        self.events.append(event)
+        self._wake()
+    
+    def finish(self):
+        self.finished = True
+        self._wake()
+    
+    def _wake(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+    
+    async def subscribe(self) -> AsyncIterator[Dict]:
+        """Yield every event published so far, then new ones until finished"""
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.finished:
+                return
+            await changed.wait()
 
 class AIService:
     """Main AI service orchestrating the multi-expert system"""
@@ -15,25 +66,202 @@ class AIService:
     def __init__(self):
         self.expert_selector = ExpertSelector()
         self.model_manager = ModelManager()
-        self.response_cache = {}
+        self.response_cache = ResponseCache(SYSTEM_CONFIG["cache_size"])
+        # Responses depend on whether real weights are used and which models
+        # back each expert, so both go into every cache key
+        self._cache_key_salt = "\x00".join([
+            CACHE_KEY_VERSION,
+            str(int(self.model_manager.load_real_models)),
+            *(config.model_id for config in self.model_manager.model_configs.values())
+        ])
+        # Persistent second tier so cached responses survive restarts
+        self.disk_cache = diskcache.Cache(
+            SYSTEM_CONFIG["cache_dir"],
+            size_limit=SYSTEM_CONFIG["disk_cache_size_limit"]
+        )
+        self._cache_min_chars = SYSTEM_CONFIG["cache_min_chars"]
+        self._cache_bucket_stats: Dict[str, Dict[str, int]] = {}
+        self._cache_lock = asyncio.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._inflight_streams: Dict[str, _StreamFanout] = {}
+        self._inflight_lock = asyncio.Lock()
         logger.info("🚀 PRAiTEQx AI Service initialized with 6-expert system")
     
-    async def process_query(self, query: str, use_multi_expert: bool = True) -> Dict:
+    async def process_query(self, query: str, use_multi_expert: bool = True,
+                            session_id: Optional[str] = None) -> Dict:
         """Process a query through the multi-expert system"""
         logger.info(f"📥 Processing query: {query[:100]}...")
         
-        # Check cache first
-        cache_key = self._generate_cache_key(query, use_multi_expert)
-        if cache_key in self.response_cache:
-            logger.info("📦 Returning cached response")
-            return self.response_cache[cache_key]
+        sticky = self.expert_selector.session_bias(query, session_id)
+        cache_key, cacheable, result = await self._check_cache(query, use_multi_expert, sticky)
+        if result is None:
+            result = await self._coalesced(query, use_multi_expert, cache_key, cacheable, sticky)
+        if session_id:
+            self.expert_selector.remember_session(session_id, result["experts_used"])
+        return result
+    
+    async def _coalesced(self, query: str, use_multi_expert: bool, cache_key: str,
+                         cacheable: bool, sticky: Tuple[str, ...]) -> Dict:
+        """Run the pipeline for a cache miss, sharing it with identical in-flight queries"""
+        # Coalesce identical concurrent queries onto a single pipeline run
+        async with self._inflight_lock:
+            task = self._inflight.get(cache_key)
+            if task is None:
+                task = asyncio.ensure_future(
+                    self._process_uncached(query, use_multi_expert, cache_key, cacheable, sticky)
+                )
+                self._inflight[cache_key] = task
+                task.add_done_callback(lambda _: self._forget_inflight(cache_key))
+            else:
+                logger.info("🔗 Joining identical in-flight query")
+            fanout = self._inflight_streams.get(cache_key)
         
-        # Select appropriate experts
-        selected_experts = self.expert_selector.select_experts(
-            query, 
-            max_experts=2 if use_multi_expert else 1
+        # Shield so one caller disconnecting does not cancel the others
+        if fanout is None:
+            return await asyncio.shield(task)
+        fanout.subscribers += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            self._leave_stream(fanout, task)
+    
+    async def process_query_stream(self, query: str, use_multi_expert: bool = True,
+                                   session_id: Optional[str] = None) -> AsyncIterator[Dict]:
+        """Process a query, yielding a meta event, text chunks and a done event"""
+        logger.info(f"📥 Streaming query: {query[:100]}...")
+        
+        sticky = self.expert_selector.session_bias(query, session_id)
+        cache_key, cacheable, cached = await self._check_cache(query, use_multi_expert, sticky)
+        if cached is not None:
+            yield {"type": "meta", "experts_used": cached["experts_used"],
+                   "response_type": cached["response_type"]}
+            yield {"type": "token", "text": cached["response"]}
+            if session_id:
+                self.expert_selector.remember_session(session_id, cached["experts_used"])
+            yield {"type": "done", "timestamp": cached["timestamp"]}
+            return
+        
+        # Share the run with identical in-flight queries: streams replay one
+        # producer's events, and a plain process_query run is sent whole
+        async with self._inflight_lock:
+            task = self._inflight.get(cache_key)
+            fanout = self._inflight_streams.get(cache_key)
+            if task is None:
+                fanout = _StreamFanout()
+                task = asyncio.ensure_future(
+                    self._produce_stream(query, use_multi_expert, cache_key, cacheable, sticky, fanout)
+                )
+                self._inflight[cache_key] = task
+                self._inflight_streams[cache_key] = fanout
+                task.add_done_callback(lambda _: self._forget_inflight(cache_key))
+            else:
+                logger.info("🔗 Joining identical in-flight query")
+        
+        if fanout is None:
+            result = await asyncio.shield(task)
+            yield {"type": "meta", "experts_used": result["experts_used"],
+                   "response_type": result["response_type"]}
+            yield {"type": "token", "text": result["response"]}
+        else:
+            fanout.subscribers += 1
+            try:
+                async for event in fanout.subscribe():
+                    yield event
+                result = await task
+            finally:
+                self._leave_stream(fanout, task)
+        
+        if session_id:
+            self.expert_selector.remember_session(session_id, result["experts_used"])
+        yield {"type": "done", "timestamp": result["timestamp"]}
+    
+    async def _produce_stream(self, query: str, use_multi_expert: bool, cache_key: str,
+                              cacheable: bool, sticky: Tuple[str, ...],
+                              fanout: _StreamFanout) -> Dict:
+        """Run the streaming pipeline for a cache miss, publishing its events"""
+        try:
+            selected_experts = self._select_experts(query, use_multi_expert, sticky)
+            if len(selected_experts) > 1 and use_multi_expert:
+                stream = self.model_manager.multi_expert_consensus_stream(selected_experts, query)
+                response_type = "multi_expert"
+            else:
+                specialized_prompt = self.expert_selector.get_expert_prompt(selected_experts[0], query)
+                stream = self.model_manager.generate_stream(selected_experts[0], specialized_prompt)
+                response_type = "single_expert"
+            
+            fanout.publish({"type": "meta", "experts_used": selected_experts, "response_type": response_type})
+            
+            chunks = []
+            async for chunk in stream:
+                chunks.append(chunk)
+                fanout.publish({"type": "token", "text": chunk})
+            
+            result = {
+                "query": query,
+                "response": "".join(chunks),
+                "experts_used": selected_experts,
+                "response_type": response_type,
+                "timestamp": time.time(),
+                "success": True
+            }
+            if cacheable:
+                await self._store_cache(cache_key, result)
+            
+            logger.info(f"✅ Query streamed successfully using {len(selected_experts)} expert(s)")
+            return result
+        finally:
+            fanout.finish()
+    
+    def _leave_stream(self, fanout: _StreamFanout, task: asyncio.Future):
+        """Drop a subscriber, stopping the producer once nobody is listening"""
+        fanout.subscribers -= 1
+        if fanout.subscribers == 0 and not task.done():
+            logger.info("🛑 All clients left, stopping streamed query")
+            task.cancel()
+    
+    def _forget_inflight(self, cache_key: str):
+        """Remove a finished run from the in-flight maps"""
+        self._inflight.pop(cache_key, None)
+        self._inflight_streams.pop(cache_key, None)
+    
+    async def _check_cache(self, query: str, use_multi_expert: bool,
+                           sticky: Tuple[str, ...]) -> Tuple[str, bool, Optional[Dict]]:
+        """Return the cache key, whether the query is cacheable, and any cached result"""
+        cache_key = self._generate_cache_key(query, use_multi_expert, sticky)
+        cacheable = len(query) >= self._cache_min_chars
+        bucket = self._cache_bucket_stats.setdefault(
+            _length_bucket(len(query)), {"hits": 0, "misses": 0, "bypassed": 0}
         )
         
+        # Short queries rarely repeat, so they skip the cache entirely
+        if not cacheable:
+            bucket["bypassed"] += 1
+            return cache_key, cacheable, None
+        
+        cached = await self._lookup_cache(cache_key)
+        bucket["hits" if cached is not None else "misses"] += 1
+        return cache_key, cacheable, cached
+    
+    async def _lookup_cache(self, cache_key: str) -> Optional[Dict]:
+        """Look up a cached result in memory, then on disk"""
+        async with self._cache_lock:
+            cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            logger.info("📦 Returning cached response")
+            return cached
+        
+        cached = await asyncio.to_thread(self.disk_cache.get, cache_key)
+        if cached is not None:
+            async with self._cache_lock:
+                self.response_cache.set(cache_key, cached)
+            logger.info("💾 Returning cached response from disk")
+        return cached
+    
+    async def _process_uncached(self, query: str, use_multi_expert: bool, cache_key: str,
+                                cacheable: bool, sticky: Tuple[str, ...] = ()) -> Dict:
+        """Run the expert pipeline for a query and cache the result"""
+        selected_experts = self._select_experts(query, use_multi_expert, sticky)
+        
         # Generate response
         if len(selected_experts) > 1 and use_multi_expert:
             response = await self._multi_expert_response(selected_experts, query)
@@ -48,16 +276,32 @@ class AIService:
             "response": response,
             "experts_used": selected_experts,
             "response_type": response_type,
-            "timestamp": asyncio.get_event_loop().time(),
+            "timestamp": time.time(),
             "success": True
         }
         
-        # Cache result
-        self.response_cache[cache_key] = result
+        if cacheable:
+            await self._store_cache(cache_key, result)
         
         logger.info(f"✅ Query processed successfully using {len(selected_experts)} expert(s)")
         return result
     
+    async def _store_cache(self, cache_key: str, result: Dict):
+        """Cache a result in memory (subject to admission) and on disk"""
+        async with self._cache_lock:
+            self.response_cache.set(cache_key, result)
+        await asyncio.to_thread(self.disk_cache.set, cache_key, result)
+    
+    def _select_experts(self, query: str, use_multi_expert: bool,
+                        sticky: Tuple[str, ...] = ()) -> List[str]:
+        """Select appropriate experts, favouring session and already loaded models"""
+        return self.expert_selector.select_experts(
+            query, 
+            max_experts=2 if use_multi_expert else 1,
+            loaded=set(self.model_manager.get_loaded_models()),
+            sticky=sticky
+        )
+    
     async def _single_expert_response(self, expert_key: str, query: str) -> str:
         """Get response from single expert"""
         specialized_prompt = self.expert_selector.get_expert_prompt(expert_key, query)
@@ -66,20 +310,20 @@ class AIService:
     
     async def _multi_expert_response(self, expert_keys: List[str], query: str) -> str:
         """Get combined response from multiple experts"""
-        specialized_prompts = [
-            self.expert_selector.get_expert_prompt(expert_key, query) 
-            for expert_key in expert_keys
-        ]
-        
-        # Use the first prompt for multi-expert consensus
+        # Consensus shares the raw query across experts, so no per-expert
+        # prompts are built on this path
         response = await self.model_manager.multi_expert_consensus(expert_keys, query)
         return response
     
-    def _generate_cache_key(self, query: str, use_multi_expert: bool) -> str:
+    def _generate_cache_key(self, query: str, use_multi_expert: bool,
+                            sticky: Tuple[str, ...] = ()) -> str:
         """Generate cache key for the query"""
-        import hashlib
-        content = f"{query}_{use_multi_expert}"
-        return hashlib.md5(content.encode()).hexdigest()[:16]
+        key = f"{self._cache_key_salt}\x00{query}\x00{int(bool(use_multi_expert))}"
+        # Session affinity changes which experts answer, so biased
+        # selections get their own entries and in-flight runs
+        if sticky:
+            key += "\x00" + ",".join(sticky)
+        return xxhash.xxh3_64_hexdigest(key.encode())
     
     async def get_system_status(self) -> Dict:
         """Get current system status"""
@@ -91,10 +335,13 @@ class AIService:
             "loaded_models": loaded_models,
             "available_experts": list(self.expert_selector.models.keys()),
             "cache_size": len(self.response_cache),
+            "cache_stats": dict(self.response_cache.stats),
+            "cache_stats_by_length": {k: dict(v) for k, v in self._cache_bucket_stats.items()},
             "status": "operational"
         }
     
     async def clear_cache(self):
         """Clear response cache"""
         self.response_cache.clear()
+        await asyncio.to_thread(self.disk_cache.clear)
         logger.info("🧹 Response cache cleared")
\ No newline at end of file
@@ -4,46 +4,77 @@ Intelligently chooses the right expert for each query
 """
 
 import re
-from typing import List, Dict, Optional
+from typing import Collection, List, Dict, Optional, Set, Tuple
+from cachetools import TTLCache
 from loguru import logger
 from config.model_config import EXPERT_SELECTION_RULES, MODEL_CONFIGS
 
+# Keyword sets per query category, built once at import time
+_CATEGORY_KEYWORDS: Dict[str, frozenset] = {
+    # Programming/Code Detection
+    'code': frozenset(['code', 'python', 'javascript', 'function', 'class', 'algorithm',
+                       'programming', 'debug', 'error', 'syntax', 'api', 'database']),
+    # Creative Writing Detection
+    'creative': frozenset(['story', 'poem', 'creative', 'write', 'imagine', 'fiction',
+                           'character', 'plot', 'narrative', 'essay', 'blog']),
+    # Search/Research Detection
+    'search': frozenset(['search', 'find', 'research', 'latest', 'current', 'news',
+                         'information', 'data', 'facts', 'recent', 'today']),
+    # Logic/Reasoning Detection
+    'reasoning': frozenset(['analyze', 'compare', 'explain', 'reasoning', 'logic', 'problem',
+                            'solution', 'think', 'calculate', 'math', 'statistics']),
+}
+_CATEGORY_SIZES: Dict[str, int] = {k: len(v) for k, v in _CATEGORY_KEYWORDS.items()}
+# One alternation per category, matched as substrings so inflected forms
+# ("debugging", "functions") still count; the lookahead lets overlapping
+# keywords ("research" and "search") both match
+_CATEGORY_PATTERNS: Dict[str, "re.Pattern[str]"] = {
+    category: re.compile("(?=(" + "|".join(
+        re.escape(k) for k in sorted(keywords, key=len, reverse=True)) + "))")
+    for category, keywords in _CATEGORY_KEYWORDS.items()
+}
+
+# Specialized prompt templates per expert
+_EXPERT_PROMPTS: Dict[str, str] = {
+    "chat_expert": "As an intelligent conversation assistant, answer this thoughtfully: {q}",
+    "code_expert": "As a programming expert, provide clean, working code solution: {q}",
+    "creative_expert": "As a creative writing specialist, craft an engaging response: {q}",
+    "quick_expert": "Provide a concise, direct answer: {q}",
+    "logic_expert": "Use logical reasoning and analysis to solve: {q}",
+    "search_expert": "Research and provide factual information about: {q}"
+}
+_DEFAULT_PROMPT = "Answer this query professionally: {q}"
+
+# Categories scoring within this margin of the best one count as a near-tie
+_CLOSE_SCORE_EPSILON = 0.05
+
+# How long a session keeps its affinity to the experts it last used
+_SESSION_TTL_SECONDS = 60
+_MAX_TRACKED_SESSIONS = 10000
+
+def _promote(subset: Collection[str], candidates: List[str]) -> List[str]:
+    """Move candidates found in subset to the front, keeping relative order"""
+    return ([e for e in candidates if e in subset] +
+            [e for e in candidates if e not in subset])
+
 class ExpertSelector:
     """Smart expert selection based on query analysis"""
     
     def __init__(self):
         self.rules = EXPERT_SELECTION_RULES
         self.models = MODEL_CONFIGS
+        self._sticky: "TTLCache[str, Tuple[str, ...]]" = TTLCache(
+            maxsize=_MAX_TRACKED_SESSIONS, ttl=_SESSION_TTL_SECONDS
+        )
         logger.info("🧠 Expert Selector initialized with 6 experts")
     
     def analyze_query(self, query: str) -> Dict[str, float]:
         """Analyze query and return confidence scores for each expert type"""
         query_lower = query.lower()
-        scores = {}
-        
-        # Programming/Code Detection
-        code_keywords = ['code', 'python', 'javascript', 'function', 'class', 'algorithm', 
-                        'programming', 'debug', 'error', 'syntax', 'api', 'database']
-        code_score = sum(1 for kw in code_keywords if kw in query_lower) / len(code_keywords)
-        scores['code'] = code_score
-        
-        # Creative Writing Detection  
-        creative_keywords = ['story', 'poem', 'creative', 'write', 'imagine', 'fiction',
-                           'character', 'plot', 'narrative', 'essay', 'blog']
-        creative_score = sum(1 for kw in creative_keywords if kw in query_lower) / len(creative_keywords)
-        scores['creative'] = creative_score
-        
-        # Search/Research Detection
-        search_keywords = ['search', 'find', 'research', 'latest', 'current', 'news',
-                         'information', 'data', 'facts', 'recent', 'today']
-        search_score = sum(1 for kw in search_keywords if kw in query_lower) / len(search_keywords)
-        scores['search'] = search_score
-        
-        # Logic/Reasoning Detection
-        logic_keywords = ['analyze', 'compare', 'explain', 'reasoning', 'logic', 'problem',
-                         'solution', 'think', 'calculate', 'math', 'statistics']
-        logic_score = sum(1 for kw in logic_keywords if kw in query_lower) / len(logic_keywords)
-        scores['reasoning'] = logic_score
+        scores = {
+            category: len(set(pattern.findall(query_lower))) / _CATEGORY_SIZES[category]
+            for category, pattern in _CATEGORY_PATTERNS.items()
+        }
         
         # Quick Response Detection (short queries)
         if len(query.split()) <= 5:
@@ -54,36 +85,61 @@ class ExpertSelector:
         logger.info(f"📊 Query analysis scores: {scores}")
         return scores
     
-    def select_experts(self, query: str, max_experts: int = 2) -> List[str]:
-        """Select best experts for the query"""
+    def select_experts(self, query: str, max_experts: int = 2,
+                       loaded: Optional[Set[str]] = None,
+                       sticky: Collection[str] = ()) -> List[str]:
+        """Select best experts for the query, preferring sticky and loaded ones on near-ties"""
         scores = self.analyze_query(query)
-        
-        # Find highest scoring category
-        best_category = max(scores.items(), key=lambda x: x[1])
-        category, confidence = best_category
-        
-        # If confidence is low, use default
-        if confidence < 0.1:
-            category = 'default'
+        category, confidence = self._best_category(scores)
         
         # Get expert list for category
-        selected_experts = self.rules.get(category, self.rules['default'])
+        candidates = list(self.rules.get(category, self.rules['default']))
+        
+        # Cache-aware routing: if other categories score almost as well,
+        # consider their experts too and favour the sticky ones (those the
+        # session used last), then those already in memory
+        if (loaded or sticky) and category != 'default':
+            close = self._close_categories(scores, category, confidence)
+            if close:
+                for other in close:
+                    candidates += [e for e in self.rules.get(other, []) if e not in candidates]
+                candidates = _promote(sticky, _promote(loaded or (), candidates))
         
         # Limit number of experts
-        selected_experts = selected_experts[:max_experts]
+        selected_experts = candidates[:max_experts]
         
         logger.info(f"🎯 Selected experts for '{category}': {selected_experts}")
         return selected_experts
     
+    def session_bias(self, query: str, session_id: Optional[str]) -> Tuple[str, ...]:
+        """Sticky experts of a session that could change the selection for
+        this query, or () when the session's affinity makes no difference"""
+        sticky = self._sticky.get(session_id, ()) if session_id else ()
+        if not sticky:
+            return ()
+        scores = self.analyze_query(query)
+        category, confidence = self._best_category(scores)
+        if category == 'default' or not self._close_categories(scores, category, confidence):
+            return ()
+        return sticky
+    
+    def _best_category(self, scores: Dict[str, float]) -> Tuple[str, float]:
+        """Highest scoring category, or default if confidence is low"""
+        category, confidence = max(scores.items(), key=lambda x: x[1])
+        if confidence < 0.1:
+            category = 'default'
+        return category, confidence
+    
+    def _close_categories(self, scores: Dict[str, float], category: str,
+                          confidence: float) -> List[str]:
+        """Other categories scoring within the near-tie margin of the best one"""
+        return [other for other, score in scores.items()
+                if other != category and confidence - score <= _CLOSE_SCORE_EPSILON]
+    
+    def remember_session(self, session_id: str, experts: List[str]):
+        """Record the experts a session just used successfully"""
+        self._sticky[session_id] = tuple(experts)
+    
     def get_expert_prompt(self, expert_type: str, query: str) -> str:
         """Generate specialized prompt for each expert"""
-        prompts = {
-            "chat_expert": f"As an intelligent conversation assistant, answer this thoughtfully: {query}",
-            "code_expert": f"As a programming expert, provide clean, working code solution: {query}",
-            "creative_expert": f"As a creative writing specialist, craft an engaging response: {query}",
-            "quick_expert": f"Provide a concise, direct answer: {query}",
-            "logic_expert": f"Use logical reasoning and analysis to solve: {query}",
-            "search_expert": f"Research and provide factual information about: {query}"
-        }
-        
-        return prompts.get(expert_type, f"Answer this query professionally: {query}")
\ No newline at end of file
+        return _EXPERT_PROMPTS.get(expert_type, _DEFAULT_PROMPT).format(q=query)
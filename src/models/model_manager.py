@@ -4,12 +4,47 @@ Handles loading, caching, and inference of multiple AI models
 """
 
 import asyncio
-from typing import Dict, List, Optional, Any
-from transformers import AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig
+import contextlib
+import os
+import re
+import shutil
+import threading
+import time
+from typing import AsyncIterator, Dict, List, Optional, Any, Set, Tuple
+from cachetools import TTLCache
+from filelock import FileLock, Timeout
+from transformers import (
+    AutoTokenizer, AutoModelForCausalLM, BitsAndBytesConfig,
+    StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+)
 import torch
 from loguru import logger
 from config.model_config import MODEL_CONFIGS, SYSTEM_CONFIG
 
+# Only mirror the files from_pretrained reads, skipping .bin duplicates and
+# GGUF/ONNX exports that some repos ship alongside the safetensors weights
+_SNAPSHOT_PATTERNS = ["*.json", "*.safetensors", "tokenizer*", "*.model"]
+
+# Written into a mirrored snapshot once snapshot_download has fully returned,
+# so an interrupted download is never mistaken for a usable snapshot
+_SNAPSHOT_MARKER = ".praiteqx-complete"
+
+# How long an expert that failed to load is skipped before it is retried
+_LOAD_RETRY_SECONDS = 300
+
+def _snapshot_name(model_id: str) -> str:
+    """Directory name the Hugging Face cache uses for a model repo"""
+    return "models--" + model_id.replace("/", "--")
+
+class _StopOnEvent(StoppingCriteria):
+    """Stops generation once the event is set"""
+    
+    def __init__(self, event: threading.Event):
+        self.event = event
+    
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
+
 class ModelManager:
     """Manages multiple AI models with intelligent loading and caching"""
     
@@ -19,6 +54,13 @@ class ModelManager:
         self.model_configs = MODEL_CONFIGS
         self.max_concurrent = SYSTEM_CONFIG['max_concurrent_models']
         self.device = "cpu"  # CPU-only for now, GPU later
+        self.load_real_models = SYSTEM_CONFIG['load_real_models']
+        self.local_cache_dir = SYSTEM_CONFIG['local_model_cache_dir']
+        self.local_cache_max_usage = SYSTEM_CONFIG['local_model_cache_max_usage']
+        self._loading: Dict[str, asyncio.Future] = {}
+        self._failed_loads: "TTLCache[str, str]" = TTLCache(
+            maxsize=len(self.model_configs), ttl=_LOAD_RETRY_SECONDS
+        )
         logger.info("🤖 Model Manager initialized")
         
         # Configure quantization for memory efficiency
@@ -34,56 +76,262 @@ class ModelManager:
         if expert_key in self.loaded_models:
             logger.info(f"✅ Model {expert_key} already loaded")
             return True
+        return await self._load_shared(expert_key) is not None
+    
+    async def _load_shared(self, expert_key: str) -> Optional[Dict[str, Any]]:
+        """Return an expert's entry, sharing one load among concurrent callers"""
+        entry = self.loaded_models.get(expert_key)
+        if entry is not None:
+            return entry
+        if expert_key in self._failed_loads:
+            logger.warning(f"⚠️ Skipping {expert_key}, it failed to load recently: "
+                           f"{self._failed_loads[expert_key]}")
+            return None
+        
+        task = self._loading.get(expert_key)
+        if task is None:
+            task = asyncio.ensure_future(self._load_model(expert_key))
+            self._loading[expert_key] = task
+            task.add_done_callback(lambda _: self._loading.pop(expert_key, None))
         
+        # Shield so one caller being cancelled does not abort the others' load
+        return await asyncio.shield(task)
+    
+    async def _load_model(self, expert_key: str) -> Optional[Dict[str, Any]]:
+        """Load an expert and only then unload others to make room for it"""
         config = self.model_configs[expert_key]
         logger.info(f"🔄 Loading {config.name}...")
         
         try:
-            # For now, we'll simulate model loading to avoid memory issues
-            # In production, this will load actual models
-            await self._simulate_model_load(expert_key, config)
-            logger.info(f"✅ {config.name} loaded successfully")
-            return True
-            
+            # Simulated by default to avoid memory issues; set
+            # PRAITEQX_LOAD_MODELS=1 to load the actual weights
+            if self.load_real_models:
+                # Snapshots of resident models must survive cache eviction;
+                # the thread gets a copy and never touches shared state
+                protected = {entry["config"].model_id for entry in self.loaded_models.values()}
+                model, tokenizer = await asyncio.to_thread(self._load_pretrained, config, protected)
+            else:
+                model, tokenizer = await self._simulate_model_load(config)
         except Exception as e:
             logger.error(f"❌ Failed to load {expert_key}: {e}")
-            return False
+            self._failed_loads[expert_key] = str(e)
+            return None
+        
+        # Evict only once the new model is ready so a failed load never
+        # costs a resident one; unloading never suspends, so no concurrent
+        # load can slip in before the insert and overshoot max_concurrent
+        await self._make_room()
+        entry = self.loaded_models[expert_key] = {
+            "model": model,
+            "tokenizer": tokenizer,
+            "config": config,
+            "loaded_at": time.monotonic()
+        }
+        self.tokenizers[expert_key] = tokenizer
+        logger.info(f"✅ {config.name} loaded successfully")
+        return entry
+    
+    async def _make_room(self):
+        """Unload least recently used models until another one fits"""
+        while self.loaded_models and len(self.loaded_models) >= self.max_concurrent:
+            lru_key = min(
+                self.loaded_models,
+                key=lambda k: self.loaded_models[k].get("last_used", self.loaded_models[k]["loaded_at"])
+            )
+            await self.unload_model(lru_key)
     
-    async def _simulate_model_load(self, expert_key: str, config):
+    async def _simulate_model_load(self, config) -> Tuple[Any, Any]:
         """Simulate model loading for MVP (replace with real loading later)"""
         # Simulate loading time
         await asyncio.sleep(1)
         
-        # Store mock model (in production, this will be real model)
-        self.loaded_models[expert_key] = {
-            "model": f"Mock-{config.name}",
-            "config": config,
-            "loaded_at": asyncio.get_event_loop().time()
-        }
+        # Mock model and tokenizer (in production, these will be real ones)
+        return f"Mock-{config.name}", f"Mock-Tokenizer-{config.name}"
+    
+    def _load_pretrained(self, config, protected: Set[str]) -> Tuple[Any, Any]:
+        """Load real weights, memory-mapped from safetensors where available"""
+        use_4bit = config.load_in_4bit and torch.cuda.is_available()
         
-        # Mock tokenizer
-        self.tokenizers[expert_key] = f"Mock-Tokenizer-{expert_key}"
+        # Hold the snapshot lock until the weights are read so no other
+        # worker can evict the snapshot mid-load
+        with self._snapshot_lock(config.model_id):
+            cache_dir = self._ensure_local_snapshot(config.model_id, protected)
+            # A mirrored snapshot already holds everything needed, so skip the Hub
+            local_only = cache_dir is not None
+            
+            tokenizer = AutoTokenizer.from_pretrained(
+                config.model_id, cache_dir=cache_dir, local_files_only=local_only
+            )
+            model = AutoModelForCausalLM.from_pretrained(
+                config.model_id,
+                cache_dir=cache_dir,
+                local_files_only=local_only,
+                low_cpu_mem_usage=True,
+                torch_dtype=torch.bfloat16,
+                device_map="auto",
+                quantization_config=self.quantization_config if use_4bit else None
+            )
+        return model, tokenizer
+    
+    def _ensure_local_snapshot(self, model_id: str, protected: Set[str]) -> Optional[str]:
+        """Mirror a model snapshot into the local cache dir, evicting old ones"""
+        if not self.local_cache_dir:
+            return None
+        
+        snapshot_dir = os.path.join(self.local_cache_dir, _snapshot_name(model_id))
+        if not self._has_local_snapshot(snapshot_dir):
+            from huggingface_hub import snapshot_download
+            
+            # Serialize eviction and downloads across workers sharing the dir
+            with FileLock(os.path.join(self.local_cache_dir, ".mirror.lock")):
+                if not self._has_local_snapshot(snapshot_dir):
+                    self._evict_local_snapshots(protected | {model_id})
+                    snapshot_download(
+                        model_id,
+                        cache_dir=self.local_cache_dir,
+                        allow_patterns=_SNAPSHOT_PATTERNS
+                    )
+                    open(os.path.join(snapshot_dir, _SNAPSHOT_MARKER), "w").close()
+        
+        # Touch the snapshot so eviction treats it as recently used
+        if os.path.isdir(snapshot_dir):
+            os.utime(snapshot_dir)
+        return self.local_cache_dir
+    
+    def _snapshot_lock(self, model_id: str):
+        """Cross-process lock marking a snapshot as in use"""
+        if not self.local_cache_dir:
+            return contextlib.nullcontext()
+        os.makedirs(self.local_cache_dir, exist_ok=True)
+        return FileLock(os.path.join(self.local_cache_dir, _snapshot_name(model_id) + ".lock"))
+    
+    def _has_local_snapshot(self, snapshot_dir: str) -> bool:
+        """Whether a snapshot has been completely mirrored locally"""
+        return os.path.exists(os.path.join(snapshot_dir, _SNAPSHOT_MARKER))
+    
+    def _evict_local_snapshots(self, protected: Set[str]):
+        """Delete least recently used snapshots, except those of the protected
+        model ids, while the cache disk is too full"""
+        keep = {_snapshot_name(model_id) for model_id in protected}
+        snapshots = sorted(
+            (entry for entry in os.scandir(self.local_cache_dir)
+             if entry.is_dir() and entry.name.startswith("models--") and entry.name not in keep),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        
+        for entry in snapshots:
+            usage = shutil.disk_usage(self.local_cache_dir)
+            if usage.used / usage.total <= self.local_cache_max_usage:
+                break
+            
+            # Skip snapshots another worker is currently downloading or loading
+            lock = FileLock(entry.path + ".lock")
+            try:
+                lock.acquire(timeout=0)
+            except Timeout:
+                continue
+            try:
+                logger.info(f"🗑️ Evicting cached snapshot {entry.name}")
+                # Drop the marker first so a partly deleted snapshot is re-mirrored
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(os.path.join(entry.path, _SNAPSHOT_MARKER))
+                shutil.rmtree(entry.path, ignore_errors=True)
+            finally:
+                lock.release()
     
     async def generate_response(self, expert_key: str, prompt: str) -> str:
         """Generate response using specific expert"""
-        if expert_key not in self.loaded_models:
-            await self.load_model(expert_key)
+        entry = await self._ensure_loaded(expert_key)
         
         config = self.model_configs[expert_key]
         logger.info(f"🧠 Generating response with {config.name}")
         
-        # For MVP, return simulated intelligent responses
-        # In production, this will use actual model inference
-        response = await self._simulate_inference(expert_key, prompt, config)
+        if self.load_real_models:
+            response = await asyncio.to_thread(self._generate_pretrained, entry, prompt)
+        else:
+            # For MVP, return simulated intelligent responses
+            response = await self._simulate_inference(expert_key, prompt, config)
         
         logger.info(f"✅ Response generated by {expert_key}")
         return response
     
+    async def generate_stream(self, expert_key: str, prompt: str) -> AsyncIterator[str]:
+        """Generate a response using a specific expert, yielding text as it is produced"""
+        entry = await self._ensure_loaded(expert_key)
+        
+        config = self.model_configs[expert_key]
+        logger.info(f"🧠 Streaming response with {config.name}")
+        
+        if self.load_real_models:
+            streamer = TextIteratorStreamer(entry["tokenizer"], skip_prompt=True, skip_special_tokens=True)
+            stop = threading.Event()
+            generation = asyncio.ensure_future(asyncio.to_thread(
+                self._generate_pretrained, entry, prompt, streamer, stop
+            ))
+            try:
+                while (chunk := await asyncio.to_thread(next, streamer, None)) is not None:
+                    if chunk:
+                        yield chunk
+                await generation
+            finally:
+                # Stop generating if the consumer goes away early (e.g. the
+                # SSE client disconnects) instead of running to max_tokens
+                stop.set()
+        else:
+            # For MVP, stream the simulated response word by word over the
+            # same total time as _simulate_inference
+            chunks = re.findall(r"\S+\s*", self._simulated_text(expert_key, prompt))
+            await asyncio.sleep(0.2)
+            for chunk in chunks:
+                yield chunk
+                await asyncio.sleep(1.8 / len(chunks))
+        
+        logger.info(f"✅ Response streamed by {expert_key}")
+    
+    async def _ensure_loaded(self, expert_key: str) -> Dict[str, Any]:
+        """Load an expert if needed, mark it as recently used and return its entry"""
+        # The returned entry stays usable even if a later load evicts it
+        entry = await self._load_shared(expert_key)
+        if entry is None:
+            # Never pass off simulated text as a real answer
+            raise RuntimeError(f"Expert {expert_key} could not be loaded")
+        entry["last_used"] = time.monotonic()
+        return entry
+    
+    def _generate_pretrained(self, entry: Dict[str, Any], prompt: str,
+                             streamer: Optional[TextIteratorStreamer] = None,
+                             stop: Optional[threading.Event] = None) -> str:
+        """Run real model inference for a prompt (the entry is passed in so a
+        concurrent unload cannot pull the model away mid-generation)"""
+        model, tokenizer, config = entry["model"], entry["tokenizer"], entry["config"]
+        
+        try:
+            inputs = tokenizer(prompt, return_tensors="pt").to(model.device)
+            output_ids = model.generate(
+                **inputs,
+                max_new_tokens=config.max_tokens,
+                do_sample=config.temperature > 0,
+                temperature=config.temperature,
+                streamer=streamer,
+                stopping_criteria=StoppingCriteriaList([_StopOnEvent(stop)]) if stop else None
+            )
+        except Exception:
+            # Unblock a consumer still waiting on the streamer
+            if streamer is not None:
+                streamer.end()
+            raise
+        
+        new_tokens = output_ids[0][inputs["input_ids"].shape[1]:]
+        return tokenizer.decode(new_tokens, skip_special_tokens=True)
+    
     async def _simulate_inference(self, expert_key: str, prompt: str, config) -> str:
         """Simulate AI inference (replace with real inference later)"""
         # Simulate processing time
         await asyncio.sleep(2)
-        
+        return self._simulated_text(expert_key, prompt)
+    
+    def _simulated_text(self, expert_key: str, prompt: str) -> str:
+        """Canned expert response used by the simulated inference paths"""
         # Generate expert-specific responses based on type
         expert_responses = {
             "chat_expert": f"🧠 **Qwen2.5 Analysis**: Based on your query, here's my thoughtful response to '{prompt[:50]}...'\n\nThis is a comprehensive analysis considering multiple perspectives and providing actionable insights.",
@@ -114,27 +362,66 @@ class ModelManager:
         
         return combined_response
     
+    async def multi_expert_consensus_stream(self, expert_keys: List[str], prompt: str) -> AsyncIterator[str]:
+        """Stream the combined multi-expert response section by section"""
+        logger.info(f"🤝 Streaming multi-expert consensus with: {expert_keys}")
+        
+        # Run all experts in parallel; the first streams live while the
+        # others buffer into their queues until their section comes up
+        queues = [asyncio.Queue() for _ in expert_keys]
+        
+        async def pump(expert_key: str, queue: asyncio.Queue):
+            try:
+                async for chunk in self.generate_stream(expert_key, prompt):
+                    await queue.put(chunk)
+                await queue.put(None)
+            except Exception as e:
+                await queue.put(e)
+        
+        tasks = [asyncio.ensure_future(pump(k, q)) for k, q in zip(expert_keys, queues)]
+        try:
+            yield self._consensus_header(expert_keys, prompt)
+            for expert_key, queue in zip(expert_keys, queues):
+                yield f"## 🎯 {self.model_configs[expert_key].name}\n\n"
+                while (chunk := await queue.get()) is not None:
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    yield chunk
+                yield "\n\n---\n\n"
+            yield self._consensus_synthesis(expert_keys)
+        finally:
+            for task in tasks:
+                task.cancel()
+    
     def _combine_expert_responses(self, expert_keys: List[str], responses: List[str], prompt: str) -> str:
         """Intelligently combine multiple expert responses"""
         logger.info("🔄 Combining expert responses...")
         
-        combined = f"# 🧠 **PRAiTEQx Multi-Expert Analysis**\n\n"
-        combined += f"**Query:** {prompt}\n\n"
-        combined += f"**Experts Consulted:** {', '.join([self.model_configs[k].name for k in expert_keys])}\n\n"
-        combined += "---\n\n"
+        combined = self._consensus_header(expert_keys, prompt)
         
         for i, (expert_key, response) in enumerate(zip(expert_keys, responses)):
             expert_name = self.model_configs[expert_key].name
             combined += f"## 🎯 {expert_name}\n\n{response}\n\n---\n\n"
         
-        # Add synthesis
-        combined += "## 🎯 **PRAiTEQx Synthesis**\n\n"
-        combined += "Based on analysis from multiple AI experts, the optimal approach combines the strengths of each perspective. "
-        combined += "This multi-expert consultation ensures comprehensive coverage and higher accuracy.\n\n"
-        combined += f"*Generated by {len(expert_keys)} specialized AI experts working in harmony.*"
-        
+        combined += self._consensus_synthesis(expert_keys)
         return combined
     
+    def _consensus_header(self, expert_keys: List[str], prompt: str) -> str:
+        """Header of a combined multi-expert response"""
+        header = f"# 🧠 **PRAiTEQx Multi-Expert Analysis**\n\n"
+        header += f"**Query:** {prompt}\n\n"
+        header += f"**Experts Consulted:** {', '.join([self.model_configs[k].name for k in expert_keys])}\n\n"
+        header += "---\n\n"
+        return header
+    
+    def _consensus_synthesis(self, expert_keys: List[str]) -> str:
+        """Closing synthesis of a combined multi-expert response"""
+        synthesis = "## 🎯 **PRAiTEQx Synthesis**\n\n"
+        synthesis += "Based on analysis from multiple AI experts, the optimal approach combines the strengths of each perspective. "
+        synthesis += "This multi-expert consultation ensures comprehensive coverage and higher accuracy.\n\n"
+        synthesis += f"*Generated by {len(expert_keys)} specialized AI experts working in harmony.*"
+        return synthesis
+    
     def get_loaded_models(self) -> List[str]:
         """Get list of currently loaded models"""
         return list(self.loaded_models.keys())
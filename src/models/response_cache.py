@@ -0,0 +1,75 @@
+"""
+PRAiTEQx Response Cache
+Bounded in-memory response cache with frequency-aware admission
+"""
+
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+class ResponseCache:
+    """LRU cache guarded by a TinyLFU-style admission filter.
+
+    Every lookup bumps an approximate access frequency for its key. When the
+    cache is full, a new entry only replaces the least recently used one if
+    its key has been requested at least as often, so a sweep of one-off
+    queries cannot flush out responses that keep getting asked for.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Any]" = OrderedDict()
+        self._freq: Dict[str, int] = {}
+        self._freq_events = 0
+        # Halve all frequencies after this many lookups so old popularity fades
+        self._freq_reset_at = max(10 * maxsize, 100)
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "admission_rejected": 0}
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return the cached value for key, or None on a miss"""
+        self._record_access(key)
+        value = self._data.get(key)
+        if value is None:
+            self.stats["misses"] += 1
+            return None
+        self._data.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def set(self, key: str, value: Any) -> bool:
+        """Store value under key; returns False if admission was rejected"""
+        if key in self._data:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            return True
+
+        if len(self._data) >= self.maxsize:
+            victim = next(iter(self._data))
+            if self._freq.get(key, 0) < self._freq.get(victim, 0):
+                self.stats["admission_rejected"] += 1
+                return False
+            self._data.popitem(last=False)
+            self.stats["evictions"] += 1
+
+        self._data[key] = value
+        return True
+
+    def clear(self):
+        """Drop all entries, frequency history and stats"""
+        self._data.clear()
+        self._freq.clear()
+        self._freq_events = 0
+        self.stats = dict.fromkeys(self.stats, 0)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._data
+
+    def _record_access(self, key: str):
+        """Bump the access frequency for key, aging all counts periodically"""
+        self._freq[key] = self._freq.get(key, 0) + 1
+        self._freq_events += 1
+        if self._freq_events >= self._freq_reset_at:
+            self._freq = {k: c // 2 for k, c in self._freq.items() if c > 1}
+            self._freq_events = 0
@@ -4,10 +4,9 @@ Beautiful and intuitive web UI for the Multi-Expert AI System
 """
 
 import gradio as gr
-import asyncio
 import httpx
 import json
-from typing import Dict, Any
+import uuid
 from loguru import logger
 import time
 
@@ -16,72 +15,77 @@ class PRAiTEQxUI:
     
     def __init__(self, api_base_url: str = "http://localhost:8000"):
         self.api_base_url = api_base_url
-        self.client = httpx.AsyncClient()
+        # One blocking client shared by every Gradio callback keeps the
+        # connection to the API alive between requests
+        self.client = httpx.Client(
+            http2=True,
+            timeout=60.0,
+            limits=httpx.Limits(max_keepalive_connections=16)
+        )
         logger.info("🎨 PRAiTEQx UI initialized")
     
-    async def process_query_async(self, query: str, use_multi_expert: bool) -> Dict[str, Any]:
-        """Process query through API"""
+    def process_query_stream(self, query: str, use_multi_expert: bool, session_id: str = None):
+        """Stream a query response from the API into the UI as it is generated"""
+        if not query.strip():
+            yield "⚠️ Please enter a query!", "", ""
+            return
+        
+        response_text = ""
+        experts_used = []
+        response_type = "unknown"
+        
         try:
-            response = await self.client.post(
-                f"{self.api_base_url}/query",
+            with self.client.stream(
+                "POST",
+                f"{self.api_base_url}/query/stream",
                 json={
                     "query": query,
-                    "use_multi_expert": use_multi_expert
-                },
-                timeout=60.0
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                return {
-                    "success": False,
-                    "response": f"❌ Error: {response.status_code} - {response.text}",
-                    "experts_used": [],
-                    "processing_time": 0
+                    "use_multi_expert": use_multi_expert,
+                    "session_id": session_id
                 }
+            ) as response:
+                if response.status_code != 200:
+                    response.read()
+                    yield f"❌ Error: {response.status_code} - {response.text}", "", "❌ Error"
+                    return
                 
-        except Exception as e:
-            logger.error(f"❌ UI Error: {e}")
-            return {
-                "success": False,
-                "response": f"❌ Connection Error: {str(e)}",
-                "experts_used": [],
-                "processing_time": 0
-            }
-    
-    def process_query_sync(self, query: str, use_multi_expert: bool):
-        """Synchronous wrapper for async query processing"""
-        if not query.strip():
-            return "⚠️ Please enter a query!", "", ""
-        
-        try:
-            # Run async function in event loop
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-            result = loop.run_until_complete(
-                self.process_query_async(query, use_multi_expert)
-            )
-            loop.close()
-            
-            if result["success"]:
-                experts_info = f"**Experts Used:** {', '.join(result['experts_used'])}\n"
-                experts_info += f"**Processing Time:** {result.get('processing_time', 0):.2f}s\n"
-                experts_info += f"**Response Type:** {result.get('response_type', 'unknown')}\n\n"
-                
-                return result["response"], experts_info, "✅ Success"
-            else:
-                return result["response"], "", "❌ Error"
+                for line in response.iter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    event = json.loads(line[len("data: "):])
+                    
+                    if event["type"] == "meta":
+                        experts_used = event["experts_used"]
+                        response_type = event["response_type"]
+                        yield response_text, self._format_expert_info(experts_used, response_type), "⏳ Generating..."
+                    elif event["type"] == "token":
+                        response_text += event["text"]
+                        yield response_text, self._format_expert_info(experts_used, response_type), "⏳ Generating..."
+                    elif event["type"] == "done":
+                        experts_info = self._format_expert_info(
+                            experts_used, response_type, event.get("processing_time", 0)
+                        )
+                        yield response_text, experts_info, "✅ Success"
+                    elif event["type"] == "error":
+                        yield f"❌ Processing Error: {event['message']}", "", "❌ Error"
                 
         except Exception as e:
-            error_msg = f"❌ Processing Error: {str(e)}"
+            error_msg = f"❌ Connection Error: {str(e)}"
             logger.error(error_msg)
-            return error_msg, "", "❌ Error"
+            yield error_msg, "", "❌ Error"
+    
+    def _format_expert_info(self, experts_used, response_type: str, processing_time: float = None) -> str:
+        """Format the expert information panel"""
+        experts_info = f"**Experts Used:** {', '.join(experts_used)}\n"
+        if processing_time is not None:
+            experts_info += f"**Processing Time:** {processing_time:.2f}s\n"
+        experts_info += f"**Response Type:** {response_type}\n\n"
+        return experts_info
     
-    async def get_system_status_async(self):
+    def get_system_status(self):
         """Get system status"""
         try:
-            response = await self.client.get(f"{self.api_base_url}/status")
+            response = self.client.get(f"{self.api_base_url}/status")
             if response.status_code == 200:
                 return response.json()
             else:
@@ -206,20 +210,24 @@ class PRAiTEQxUI:
                     ["Write a poem about programming", True],
                     ["Compare machine learning algorithms", True],
                 ],
-                inputs=[query_input, multi_expert_toggle]
+                inputs=[query_input, multi_expert_toggle],
+                cache_examples=False
             )
             
+            # Per-browser-session ID so the API can keep a conversation on the same experts
+            session_state = gr.State(lambda: uuid.uuid4().hex)
+            
             # Event handlers
             submit_btn.click(
-                fn=self.process_query_sync,
-                inputs=[query_input, multi_expert_toggle],
+                fn=self.process_query_stream,
+                inputs=[query_input, multi_expert_toggle, session_state],
                 outputs=[response_output, expert_info, status_output]
             )
             
             # Enter key support
             query_input.submit(
-                fn=self.process_query_sync,
-                inputs=[query_input, multi_expert_toggle],
+                fn=self.process_query_stream,
+                inputs=[query_input, multi_expert_toggle, session_state],
                 outputs=[response_output, expert_info, status_output]
             )
             
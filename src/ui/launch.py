@@ -3,18 +3,17 @@ PRAiTEQx Launch Script
 Launches both FastAPI backend and Gradio frontend with environment variables
 """
 
-import asyncio
 import threading
 import time
-import uvicorn
 from loguru import logger
-from src.api.app import create_app
-from src.ui.gradio_interface import create_gradio_app
 import os
 from dotenv import load_dotenv
 
 def run_fastapi():
-    """Run FastAPI backend server"""
+    """Run FastAPI backend server (single worker, it runs in a background thread)"""
+    import uvicorn
+    from src.api.app import create_app
+    
     load_dotenv()
     host = os.getenv("API_HOST", "0.0.0.0")
     port = int(os.getenv("API_PORT", 8000))
@@ -25,25 +24,47 @@ def run_fastapi():
         app,
         host=host,
         port=port,
+        loop="auto",  # uvloop/httptools when installed
+        http="auto",
         reload=False,  # Disable reload in production
         log_level=os.getenv("LOG_LEVEL", "info").lower()
     )
 
+def wait_for_api(base_url: str, timeout: float = 60.0, interval: float = 0.05) -> bool:
+    """Poll the API health endpoint until it responds or the timeout expires"""
+    import httpx
+    
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1.0).status_code == 200:
+                return True
+        except httpx.HTTPError:
+            pass
+        time.sleep(interval)
+    return False
+
 def run_gradio():
     """Run Gradio frontend"""
+    from src.ui.gradio_interface import create_gradio_app
+    
     load_dotenv()
     host = os.getenv("API_HOST", "0.0.0.0")
     api_port = int(os.getenv("API_PORT", 8000))
     ui_port = int(os.getenv("UI_PORT", 7860))
     
+    share = os.getenv("GRADIO_SHARE", "0") == "1"
+    api_base_url = f"http://{host}:{api_port}"
+    
     logger.info(f"🎨 Starting Gradio frontend at http://{host}:{ui_port}...")
-    time.sleep(3)  # Wait for FastAPI to start
+    if not wait_for_api(api_base_url):
+        logger.warning(f"⚠️ FastAPI backend at {api_base_url} is not responding yet")
     
-    interface = create_gradio_app(f"http://{host}:{api_port}")
+    interface = create_gradio_app(api_base_url)
     interface.launch(
         server_name=host,
         server_port=ui_port,
-        share=True,  # This creates a public URL
+        share=share,  # GRADIO_SHARE=1 creates a public URL
         show_error=True
     )
 
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the repo root importable so tests can import src and config
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
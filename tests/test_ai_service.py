@@ -0,0 +1,79 @@
+import asyncio
+
+import pytest
+
+from config.model_config import SYSTEM_CONFIG
+from src.models.ai_service import AIService
+
+QUERY = "Explain how the response cache coalesces identical requests across clients"
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setitem(SYSTEM_CONFIG, "cache_dir", str(tmp_path / "response_cache"))
+    service = AIService()
+    yield service
+    service.disk_cache.close()
+
+def test_identical_concurrent_queries_run_pipeline_once(service, monkeypatch):
+    calls = []
+    
+    async def fake_response(experts, query):
+        calls.append(query)
+        await asyncio.sleep(0.05)
+        return "answer"
+    
+    monkeypatch.setattr(service, "_multi_expert_response", fake_response)
+    monkeypatch.setattr(service, "_single_expert_response", fake_response)
+    
+    async def run():
+        return await asyncio.gather(*(service.process_query(QUERY) for _ in range(5)))
+    
+    results = asyncio.run(run())
+    
+    assert len(calls) == 1
+    assert all(r["response"] == "answer" for r in results)
+    assert not service._inflight
+
+def test_identical_concurrent_streams_share_one_producer(service, monkeypatch):
+    calls = []
+    
+    async def fake_stream(expert_key, prompt):
+        calls.append(prompt)
+        for word in ("streamed ", "answer"):
+            await asyncio.sleep(0.01)
+            yield word
+    
+    monkeypatch.setattr(service.model_manager, "generate_stream", fake_stream)
+    
+    async def collect():
+        return [e async for e in service.process_query_stream(QUERY, use_multi_expert=False)]
+    
+    async def run():
+        return await asyncio.gather(collect(), collect(), service.process_query(QUERY, False))
+    
+    first, second, result = asyncio.run(run())
+    
+    assert len(calls) == 1
+    for events in (first, second):
+        assert [e["type"] for e in events] == ["meta", "token", "token", "done"]
+        assert "".join(e["text"] for e in events if e["type"] == "token") == "streamed answer"
+    assert result["response"] == "streamed answer"
+    assert not service._inflight and not service._inflight_streams
+
+def test_session_bias_does_not_leak_through_cache(service):
+    query = "write python code with a class and function for my story poem plot and more"
+    service.expert_selector.remember_session("coder", ["code_expert"])
+    
+    async def run():
+        biased = await service.process_query(query, use_multi_expert=False, session_id="coder")
+        # Unload so loaded-model promotion does not pick code_expert either
+        await service.model_manager.unload_model("code_expert")
+        plain = await service.process_query(query, use_multi_expert=False)
+        return biased, plain
+    
+    service.model_manager._simulate_model_load = lambda config: asyncio.sleep(0, result=("m", "t"))
+    service.model_manager._simulate_inference = lambda key, prompt, config: asyncio.sleep(0, result=key)
+    biased, plain = asyncio.run(run())
+    
+    assert biased["experts_used"] == ["code_expert"]
+    assert plain["experts_used"] == ["creative_expert"]
@@ -0,0 +1,33 @@
+from src.models.expert_selector import ExpertSelector
+
+# creative (4 of 11 keywords) and code (4 of 12) score within epsilon
+NEAR_TIE_QUERY = "write python code with a class and function for my story poem plot"
+# creative clearly wins over code
+CLEAR_WIN_QUERY = "write a story poem plot narrative about a python"
+
+def test_loaded_expert_promoted_on_near_tie():
+    selector = ExpertSelector()
+    
+    assert selector.select_experts(NEAR_TIE_QUERY) == ["creative_expert", "chat_expert"]
+    assert selector.select_experts(NEAR_TIE_QUERY, loaded={"code_expert"}) == \
+        ["code_expert", "creative_expert"]
+
+def test_loaded_expert_not_promoted_without_near_tie():
+    selector = ExpertSelector()
+    
+    assert selector.select_experts(CLEAR_WIN_QUERY, loaded={"code_expert"}) == \
+        ["creative_expert", "chat_expert"]
+
+def test_session_bias_only_applies_on_near_tie():
+    selector = ExpertSelector()
+    selector.remember_session("s1", ["code_expert"])
+    
+    assert selector.session_bias(NEAR_TIE_QUERY, "s1") == ("code_expert",)
+    assert selector.session_bias(CLEAR_WIN_QUERY, "s1") == ()
+    assert selector.session_bias(NEAR_TIE_QUERY, "unknown") == ()
+    assert selector.select_experts(NEAR_TIE_QUERY, sticky=("code_expert",))[0] == "code_expert"
+
+def test_inflected_keywords_still_score():
+    scores = ExpertSelector().analyze_query("debugging these functions errors and algorithms")
+    
+    assert scores["code"] > 0
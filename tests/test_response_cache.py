@@ -0,0 +1,57 @@
+from src.models.response_cache import ResponseCache
+
+def test_one_off_sweep_does_not_evict_hot_keys():
+    cache = ResponseCache(maxsize=2)
+    for key in ("hot-a", "hot-b"):
+        for _ in range(3):
+            cache.get(key)
+        cache.set(key, key.upper())
+    
+    for i in range(50):
+        key = f"one-off-{i}"
+        if cache.get(key) is None:
+            cache.set(key, i)
+    
+    assert "hot-a" in cache and "hot-b" in cache
+    assert cache.stats["admission_rejected"] == 50
+    assert cache.stats["evictions"] == 0
+
+def test_evicts_least_recently_used_when_admitted():
+    cache = ResponseCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.get("c")
+    
+    assert cache.set("c", 3)
+    assert cache.stats["evictions"] == 1
+    assert "b" not in cache
+    assert "a" in cache and "c" in cache
+
+def test_frequencies_age_so_old_popularity_fades():
+    cache = ResponseCache(maxsize=1)
+    for _ in range(40):
+        cache.get("old")
+    cache.set("old", "stale")
+    
+    # Enough lookups of other keys to halve the counts repeatedly
+    for _ in range(4):
+        for i in range(cache._freq_reset_at):
+            cache.get(f"filler-{i % 10}")
+    assert cache._freq.get("old", 0) < 4
+    
+    for _ in range(4):
+        cache.get("new")
+    assert cache.set("new", "fresh")
+    assert "old" not in cache
+
+def test_clear_resets_entries_and_stats():
+    cache = ResponseCache(maxsize=1)
+    cache.get("a")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.clear()
+    
+    assert len(cache) == 0
+    assert cache.stats == {"hits": 0, "misses": 0, "evictions": 0, "admission_rejected": 0}
+    assert cache.get("a") is None